@@ -1,13 +1,12 @@
 import streamlit as st
-import pandas as pd
 import datetime
 import auth
-from utils import init_db, add_transaction, get_transactions, get_portfolio_stats, update_transaction, delete_transaction, get_managed_assets, add_managed_asset, delete_managed_asset
+from utils import init_db, add_transaction, get_transactions, get_portfolio_stats, save_transaction_changes, get_managed_assets, get_managed_tickers, add_managed_asset, delete_managed_asset
 
 # Page Config
 st.set_page_config(page_title="Investment Tracker", page_icon="📈", layout="wide")
 
-# Initialize DB
+# Initialize DB (cached, only the first run of the process touches the schema)
 init_db()
 
 # Authentication
@@ -42,11 +41,10 @@ if page == "Add Transaction":
     with col1:
         date = st.date_input("Date", datetime.date.today())
         # Check for managed assets
-        managed_assets = get_managed_assets(asset_type)
-        if not managed_assets.empty:
+        managed_tickers = get_managed_tickers(asset_type)
+        if managed_tickers:
            # Create list with "Other" option
-           asset_options = managed_assets['ticker'].tolist()
-           asset_options.append("Other...")
+           asset_options = managed_tickers + ["Other..."]
            
            selected_ticker = st.selectbox("Ticker Symbol", asset_options)
            if selected_ticker == "Other...":
@@ -97,15 +95,14 @@ elif page == "Dashboard":
         st.subheader("Asset Performance")
         details_df = stats['details']
         
-        # Formatting for display
-        display_df = details_df.copy()
-        display_df['Invested'] = display_df['Invested'].apply(lambda x: f"${x:,.2f}")
-        display_df['Current Price'] = display_df['Current Price'].apply(lambda x: f"${x:,.2f}" if x else "N/A")
-        display_df['Current Value'] = display_df['Current Value'].apply(lambda x: f"${x:,.2f}")
-        display_df['Profit/Loss'] = display_df['Profit/Loss'].apply(lambda x: f"${x:,.2f}")
-        display_df['Return %'] = display_df['Return %'].apply(lambda x: f"{x:.2f}%")
-        
-        st.dataframe(display_df)
+        # Formatting for display (applied by the Styler at render time, data stays numeric)
+        st.dataframe(details_df.style.format({
+            "Invested": "${:,.2f}",
+            "Current Price": "${:,.2f}",
+            "Current Value": "${:,.2f}",
+            "Profit/Loss": "${:,.2f}",
+            "Return %": "{:.2f}%"
+        }, na_rep="N/A"))
         
         # Charts
         col_chart1, col_chart2 = st.columns(2)
@@ -126,91 +123,53 @@ elif page == "History":
     st.header("📜 Transaction History")
     df = get_transactions()
     
-    if "edit_id" not in st.session_state:
-        st.session_state.edit_id = None
+    # Bumped after a save so the editor starts clean from the reloaded data
+    if "history_editor_version" not in st.session_state:
+        st.session_state.history_editor_version = 0
 
     if not df.empty:
-        # Headers
-        c1, c2, c3, c4, c5, c6, c7 = st.columns([2, 1, 1, 1, 1, 0.5, 0.5])
-        c1.markdown("**Date | Ticker**")
-        c2.markdown("**Type**")
-        c3.markdown("**Amount**")
-        c4.markdown("**Quantity**")
-        c5.markdown("**Price/Unit**")
-        c6.markdown("")
-        c7.markdown("")
+        df["price_per_unit"] = (df["amount"] / df["quantity"].where(df["quantity"] != 0)).fillna(0)
         
-        for index, row in df.iterrows():
-            with st.container():
-                c1, c2, c3, c4, c5, c6, c7 = st.columns([2, 1, 1, 1, 1, 0.5, 0.5])
-                
-                # Display Row
-                c1.write(f"{row['date']} | **{row['ticker']}**")
-                c2.write(row['asset_type'])
-                c3.write(f"${row['amount']:,.2f}")
-                c4.write(f"{row['quantity']:.8f}")
-                price_per_unit = row['amount'] / row['quantity'] if row['quantity'] else 0
-                c5.write(f"${price_per_unit:,.2f}")
-                
-                # Edit Button
-                if c6.button("✏️", key=f"edit_{row['id']}", help="Edit Transaction"):
-                    st.session_state.edit_id = row['id']
-                    st.rerun()
-                
-                # Delete Button
-                if c7.button("🗑️", key=f"delete_{row['id']}", help="Delete Transaction"):
-                    delete_transaction(row['id'])
-                    st.toast(f"Transaction {row['id']} deleted.")
-                    st.rerun()
-                
-                # Edit Form (Conditional)
-                if st.session_state.edit_id == row['id']:
-                    with st.expander(f"Editing {row['ticker']}", expanded=True):
-                        with st.form(key=f"edit_form_{row['id']}"):
-                            c_edit1, c_edit2 = st.columns(2)
-                            with c_edit1:
-                                new_date = st.date_input("Date", pd.to_datetime(row['date']))
-                                new_asset_type = st.selectbox("Type", ["Stock", "Crypto", "ETF"], 
-                                                            index=["Stock", "Crypto", "ETF"].index(row['asset_type']) if row['asset_type'] in ["Stock", "Crypto", "ETF"] else 0)
-                                
-                                # Check for managed assets
-                                managed_assets = get_managed_assets(new_asset_type)
-                                if not managed_assets.empty:
-                                   asset_options = managed_assets['ticker'].tolist()
-                                   asset_options.append("Other...")
-                                   
-                                   current_index = 0
-                                   if row['ticker'] in asset_options:
-                                       current_index = asset_options.index(row['ticker'])
-                                   else:
-                                       current_index = len(asset_options) - 1 # Default to Other if not found
-                                   
-                                   selected_ticker = st.selectbox("Ticker", asset_options, index=current_index, key=f"edit_ticker_select_{row['id']}")
-                                   if selected_ticker == "Other...":
-                                       new_ticker = st.text_input("Enter Ticker", row['ticker'], key=f"edit_ticker_text_{row['id']}").upper()
-                                   else:
-                                       new_ticker = selected_ticker
-                                else:
-                                    new_ticker = st.text_input("Ticker", row['ticker'], key=f"edit_ticker_text_{row['id']}").upper()
-                            with c_edit2:
-                                new_amount = st.number_input("Amount ($)", value=float(row['amount']), min_value=0.01)
-                                new_quantity = st.number_input("Quantity", value=float(row['quantity']), min_value=0.00000001, format="%.8f")
-                            
-                            if new_quantity > 0:
-                                st.caption(f"Price/Unit: ${new_amount/new_quantity:,.2f}")
-
-                            col_save, col_cancel = st.columns([1, 1])
-                            with col_save:
-                                if st.form_submit_button("💾 Save Changes"):
-                                    update_transaction(row['id'], new_date, new_asset_type, new_ticker, new_amount, new_quantity)
-                                    st.session_state.edit_id = None
-                                    st.success("Updated!")
-                                    st.rerun()
-                            with col_cancel:
-                                if st.form_submit_button("❌ Cancel"):
-                                    st.session_state.edit_id = None
-                                    st.rerun()
-                st.divider()
+        st.caption("Edit cells in place, add rows at the bottom or select rows to delete them, then save.")
+        
+        # One table widget instead of per-row buttons and forms
+        edited = st.data_editor(
+            df,
+            column_config={
+                "date": st.column_config.DateColumn("Date", required=True),
+                "ticker": st.column_config.TextColumn("Ticker", required=True),
+                "asset_type": st.column_config.SelectboxColumn("Type", options=["Stock", "Crypto", "ETF"], required=True),
+                "amount": st.column_config.NumberColumn("Amount", min_value=0.01, format="$%.2f", required=True),
+                "quantity": st.column_config.NumberColumn("Quantity", min_value=0.00000001, format="%.8f", required=True),
+                "price_per_unit": st.column_config.NumberColumn("Price/Unit", format="$%.2f", disabled=True),
+            },
+            column_order=["date", "ticker", "asset_type", "amount", "quantity", "price_per_unit"],
+            hide_index=True,
+            num_rows="dynamic",
+            use_container_width=True,
+            key=f"history_editor_{st.session_state.history_editor_version}",
+        )
+        
+        # Diff the edited table against the stored rows
+        fields = ["date", "asset_type", "ticker", "amount", "quantity"]
+        original = df.set_index("id")[fields]
+        kept = edited.dropna(subset=["id"]).astype({"id": df["id"].dtype}).set_index("id")[fields]
+        added = edited[edited["id"].isna()][fields]
+        deleted = original.index.difference(kept.index)
+        changed = kept[(kept != original.loc[kept.index]).any(axis=1)]
+        
+        if st.button("💾 Save Changes", type="primary", disabled=added.empty and changed.empty and deleted.empty):
+            if added.isna().any().any() or changed.isna().any().any():
+                st.error("Please fill in all fields correctly.")
+            else:
+                save_transaction_changes(
+                    added=added.to_dict("records"),
+                    updated=changed.reset_index().to_dict("records"),
+                    deleted=deleted.tolist()
+                )
+                st.session_state.history_editor_version += 1
+                st.toast(f"Saved {len(added)} added, {len(changed)} updated and {len(deleted)} deleted transactions.")
+                st.rerun()
 
     else:
         st.info("No history available.")
@@ -1,5 +1,4 @@
 import sqlite3
-import pandas as pd
 
 DB_PATH = "data/investments.db"
 
@@ -9,15 +8,17 @@ def inspect_db():
         conn = sqlite3.connect(DB_PATH)
         
         # Check tables
-        tables = pd.read_sql_query("SELECT name FROM sqlite_master WHERE type='table'", conn)
+        tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")]
         print("Tables found:")
         print(tables)
         
-        # Check managed_assets
-        if 'managed_assets' in tables['name'].values:
+        # Check managed_assets (rows are streamed from the cursor, not loaded at once)
+        if 'managed_assets' in tables:
             print("\nContent of managed_assets:")
-            df = pd.read_sql_query("SELECT * FROM managed_assets", conn)
-            print(df)
+            cur = conn.execute("SELECT * FROM managed_assets")
+            print(tuple(col[0] for col in cur.description))
+            for row in cur:
+                print(row)
         else:
             print("\nTable 'managed_assets' NOT found.")
             
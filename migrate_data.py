@@ -3,6 +3,7 @@ import sqlite3
 import pandas as pd
 from streamlit_gsheets import GSheetsConnection
 import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 ST_DB_PATH = "data/investments.db"
 SHEET_INVESTMENTS = "investments"
@@ -51,15 +52,33 @@ if st.button("Start Migration"):
     try:
         conn_gs = st.connection("gsheets", type=GSheetsConnection)
         
+        uploads = {}
         if not df_inv.empty:
-            st.info("Uploading investments... (this may take a moment)")
-            conn_gs.update(worksheet=SHEET_INVESTMENTS, data=df_inv)
-            st.success("✅ Investments uploaded!")
-            
+            uploads["Investments"] = (SHEET_INVESTMENTS, df_inv)
         if not df_assets.empty:
-            st.info("Uploading managed assets...")
-            conn_gs.update(worksheet=SHEET_MANAGED, data=df_assets)
-            st.success("✅ Managed Assets uploaded!")
+            uploads["Managed Assets"] = (SHEET_MANAGED, df_assets)
+            
+        if uploads:
+            st.info("Uploading sheets... (this may take a moment)")
+            # Sheets upload concurrently; Streamlit calls stay on the script thread
+            failed = []
+            with ThreadPoolExecutor(max_workers=len(uploads)) as executor:
+                futures = {
+                    executor.submit(conn_gs.update, worksheet=worksheet, data=data): label
+                    for label, (worksheet, data) in uploads.items()
+                }
+                for future in as_completed(futures):
+                    if future.exception() is None:
+                        st.success(f"✅ {futures[future]} uploaded!")
+                    else:
+                        failed.append(futures[future])
+            
+            # The shared client may not be thread-safe: retry failed sheets one at a time
+            for label in failed:
+                worksheet, data = uploads[label]
+                st.info(f"Retrying {label} upload...")
+                conn_gs.update(worksheet=worksheet, data=data)
+                st.success(f"✅ {label} uploaded!")
             
     except Exception as e:
         st.error(f"Error uploading to Google Sheets: {e}")
@@ -4,10 +4,13 @@ def inspect_ticker(symbol):
     print(f"\n--- Inspecting {symbol} ---")
     try:
         t = yf.Ticker(symbol)
-        info = t.info
+        fast = t.fast_info
+        # fast_info has no display name, so the full .info payload is fetched for that field only
+        info = t.get_info()
         print(f"Name: {info.get('longName') or info.get('shortName')}")
-        print(f"Type: {info.get('quoteType')}")
-        print(f"Price: {t.fast_info.last_price}")
+        print(f"Type: {fast.quote_type}")
+        print(f"Currency: {fast.currency}")
+        print(f"Price: {fast.last_price}")
     except Exception as e:
         print(f"Error: {e}")
 
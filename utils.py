@@ -1,18 +1,33 @@
 import streamlit as st
 from sqlalchemy import text
+from sqlalchemy.exc import SQLAlchemyError
 import pandas as pd
+import numpy as np
 import yfinance as yf
 import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 # Cache TTL
 TTL = 0 
+DATA_TTL = 60
+TX_TTL = 30
+PRICE_TTL = 60
 
+@st.cache_resource
 def get_connection():
-    """Returns the SQL connection object for Supabase."""
+    """Returns the shared SQL connection object for Supabase (created once per process)."""
     return st.connection("supabase", type="sql")
 
+def _clear_data_caches():
+    """Drops cached query results so mutations are visible on the next rerun."""
+    _get_transactions_cached.clear()
+    _get_managed_assets_cached.clear()
+    _get_managed_tickers_cached.clear()
+    compute_portfolio_stats.clear()
+
+@st.cache_resource(show_spinner=False)
 def init_db():
-    """Initializes the database tables if they don't exist."""
+    """Initializes the database tables if they don't exist (runs once per process)."""
     conn = get_connection()
     with conn.session as s:
         # Investments Table
@@ -36,68 +51,147 @@ def init_db():
             );
         '''))
         
-        # Check for default managed assets
-        result = s.execute(text("SELECT count(*) FROM managed_assets")).fetchone()[0]
-        if result == 0:
-            s.execute(text("INSERT INTO managed_assets (ticker, asset_type) VALUES (:t, :a)"), [{"t": "BTC", "a": "Crypto"}, {"t": "ETH", "a": "Crypto"}, {"t": "BNB", "a": "Crypto"}])
+        # Indexes for History ordering and managed asset lookups (the Dashboard groups on a
+        # computed symbol, which a (ticker, asset_type) index cannot serve, so none is kept for it)
+        s.execute(text("DROP INDEX IF EXISTS idx_inv_ticker_type;"))
+        s.execute(text("CREATE INDEX IF NOT EXISTS idx_inv_date ON investments (date DESC);"))
+        s.execute(text("CREATE INDEX IF NOT EXISTS idx_managed_type ON managed_assets (asset_type);"))
+        
+        # Default managed assets, seeded only into an empty table (no separate count query)
+        s.execute(text('''
+            INSERT INTO managed_assets (ticker, asset_type)
+            SELECT t, a FROM (VALUES ('BTC', 'Crypto'), ('ETH', 'Crypto'), ('BNB', 'Crypto')) AS defaults (t, a)
+            WHERE NOT EXISTS (SELECT 1 FROM managed_assets);
+        '''))
             
         s.commit()
 
+def _transaction_params(date, asset_type, ticker, amount, quantity):
+    """Builds the bind parameters for one investments row (tickers are stored uppercased)."""
+    return {"d": date, "a": asset_type, "t": ticker.upper(), "am": amount, "q": quantity}
+
+def _insert_transactions(s, params):
+    """Inserts one row (dict) or many rows (list of dicts) of _transaction_params in session `s`."""
+    s.execute(
+        text("INSERT INTO investments (date, asset_type, ticker, amount, quantity) VALUES (:d, :a, :t, :am, :q)"),
+        params
+    )
+
 def add_transaction(date, asset_type, ticker, amount, quantity):
     """Adds a new investment transaction."""
     conn = get_connection()
     with conn.session as s:
-        s.execute(
-            text("INSERT INTO investments (date, asset_type, ticker, amount, quantity) VALUES (:d, :a, :t, :am, :q)"),
-            {"d": date, "a": asset_type, "t": ticker.upper(), "am": amount, "q": quantity}
-        )
+        _insert_transactions(s, _transaction_params(date, asset_type, ticker, amount, quantity))
+        s.commit()
+    _clear_data_caches()
+
+def add_transactions_bulk(rows):
+    """Adds many (date, asset_type, ticker, amount, quantity) transactions in a single commit (e.g. for CSV imports)."""
+    params = [_transaction_params(*row) for row in rows]
+    if not params:
+        return
+    conn = get_connection()
+    with conn.session as s:
+        _insert_transactions(s, params)
         s.commit()
+    _clear_data_caches()
 
 def get_transactions():
     """Retrieves all transactions."""
-    conn = get_connection()
     try:
-        # caching logic handled by st.connection if needed, but for now we read fresh
-        df = conn.query("SELECT * FROM investments ORDER BY date DESC", ttl=TTL)
-        if df.empty:
-             return pd.DataFrame(columns=["id", "date", "asset_type", "ticker", "amount", "quantity"])
-        
-        # Ensure numeric types for downstream math
-        df['amount'] = pd.to_numeric(df['amount'])
-        df['quantity'] = pd.to_numeric(df['quantity'])
-        return df
+        return _get_transactions_cached()
     except Exception:
         return pd.DataFrame()
 
-def update_transaction(id, date, asset_type, ticker, amount, quantity):
-    """Updates an existing transaction."""
+@st.cache_data(ttl=TX_TTL, show_spinner=False)
+def _get_transactions_cached():
+    """Reads the investments table (raises on DB errors so failures are never cached)."""
     conn = get_connection()
-    with conn.session as s:
-        s.execute(
-            text("UPDATE investments SET date = :d, asset_type = :a, ticker = :t, amount = :am, quantity = :q WHERE id = :id"),
-            {"d": date, "a": asset_type, "t": ticker.upper(), "am": amount, "q": quantity, "id": id}
-        )
-        s.commit()
+    # Only the columns the app uses, with numeric types cast in SQL for downstream math
+    df = conn.query("""
+        SELECT id, date, asset_type, ticker, amount::float8 AS amount, quantity::float8 AS quantity
+        FROM investments
+        ORDER BY date DESC
+    """, ttl=TTL)
+    if df.empty:
+         return pd.DataFrame(columns=["id", "date", "asset_type", "ticker", "amount", "quantity"])
+    return df
+
+def get_aggregated_positions():
+    """Retrieves invested amount and quantity summed per Yahoo symbol and asset type.
+
+    Not cached on its own: compute_portfolio_stats memoizes it under the table signature.
+    DB errors propagate; callers handle them.
+    """
+    conn = get_connection()
+    # Yahoo symbol: crypto is quoted in USD (the only place this rule lives)
+    return conn.query("""
+        SELECT
+            CASE WHEN asset_type = 'Crypto' AND RIGHT(ticker, 4) <> '-USD'
+                 THEN ticker || '-USD' ELSE ticker END AS symbol,
+            asset_type,
+            SUM(amount)::float8 AS amount,
+            SUM(quantity)::float8 AS quantity
+        FROM investments
+        GROUP BY 1, asset_type
+        ORDER BY 1
+    """, ttl=TTL)
 
-def delete_transaction(id):
-    """Deletes a transaction."""
+def save_transaction_changes(added=(), updated=(), deleted=()):
+    """Applies added, updated and deleted transactions (e.g. from the History editor) in one commit."""
     conn = get_connection()
     with conn.session as s:
-        s.execute(text("DELETE FROM investments WHERE id = :id"), {"id": id})
+        if added:
+            _insert_transactions(s, [
+                _transaction_params(r["date"], r["asset_type"], r["ticker"], float(r["amount"]), float(r["quantity"]))
+                for r in added
+            ])
+        if updated:
+            s.execute(
+                text("UPDATE investments SET date = :d, asset_type = :a, ticker = :t, amount = :am, quantity = :q WHERE id = :id"),
+                [
+                    {**_transaction_params(r["date"], r["asset_type"], r["ticker"], float(r["amount"]), float(r["quantity"])), "id": int(r["id"])}
+                    for r in updated
+                ]
+            )
+        if deleted:
+            s.execute(text("DELETE FROM investments WHERE id = :id"), [{"id": int(id)} for id in deleted])
         s.commit()
+    _clear_data_caches()
 
 def get_managed_assets(asset_type=None):
     """Retrieves managed assets."""
-    conn = get_connection()
     try:
-        if asset_type:
-            df = conn.query("SELECT * FROM managed_assets WHERE asset_type = :a ORDER BY ticker", params={"a": asset_type}, ttl=TTL)
-        else:
-            df = conn.query("SELECT * FROM managed_assets ORDER BY asset_type, ticker", ttl=TTL)
-        return df
+        return _get_managed_assets_cached(asset_type)
     except Exception:
         return pd.DataFrame()
 
+@st.cache_data(ttl=DATA_TTL, show_spinner=False)
+def _get_managed_assets_cached(asset_type):
+    """Reads managed assets (raises on DB errors so failures are never cached)."""
+    conn = get_connection()
+    if asset_type:
+        return conn.query("SELECT * FROM managed_assets WHERE asset_type = :a ORDER BY ticker", params={"a": asset_type}, ttl=TTL)
+    return conn.query("SELECT * FROM managed_assets ORDER BY asset_type, ticker", ttl=TTL)
+
+def get_managed_tickers(asset_type):
+    """Retrieves the managed tickers of an asset type as a plain list (for dropdowns)."""
+    try:
+        return _get_managed_tickers_cached(asset_type)
+    except Exception:
+        return []
+
+@st.cache_data(ttl=DATA_TTL, show_spinner=False)
+def _get_managed_tickers_cached(asset_type):
+    """Reads managed tickers (raises on DB errors so failures are never cached)."""
+    conn = get_connection()
+    with conn.session as s:
+        rows = s.execute(
+            text("SELECT ticker FROM managed_assets WHERE asset_type = :a ORDER BY ticker"),
+            {"a": asset_type}
+        ).fetchall()
+    return [r[0] for r in rows]
+
 def add_managed_asset(ticker, asset_type):
     """Adds a new managed asset."""
     conn = get_connection()
@@ -108,6 +202,7 @@ def add_managed_asset(ticker, asset_type):
                 {"t": ticker.upper(), "a": asset_type}
              )
              s.commit()
+        _clear_data_caches()
         return True
     except Exception:
         return False
@@ -118,75 +213,142 @@ def delete_managed_asset(id):
     with conn.session as s:
         s.execute(text("DELETE FROM managed_assets WHERE id = :id"), {"id": id})
         s.commit()
+    _clear_data_caches()
 
 
-# --- Pricing and Stats (Unchanged Logic, just helper) ---
+# --- Pricing and Stats ---
 
-def get_current_price(ticker, asset_type=None):
-    """Fetches the current price of a stock or crypto using yfinance."""
-    print(f"Fetching price for {ticker} ({asset_type})")
-    
-    if asset_type == "Crypto" and not ticker.endswith("-USD"):
-        ticker = f"{ticker}-USD"
-        
+class _IncompleteResult(Exception):
+    """Carries a result with missing quotes out of a cached function so it is returned but never memoized."""
+    def __init__(self, result):
+        super().__init__("result has missing quotes")
+        self.result = result
+
+def get_current_price(symbol):
+    """Fetches the current price of an already normalized Yahoo symbol."""
+    return get_current_prices([symbol]).get(symbol)
+
+def _fetch_quote(symbol):
+    """Looks up a single symbol through its yfinance Ticker (fallback for get_current_prices)."""
     try:
-        ticker_obj = yf.Ticker(ticker)
+        ticker_obj = yf.Ticker(symbol)
         try:
-            price = ticker_obj.fast_info.last_price
-        except AttributeError:
+            price = getattr(ticker_obj.fast_info, "last_price", None)
+        except Exception:
             price = None
             
-        if price is None or price == 0:
-             history = ticker_obj.history(period="1d")
+        # history is a full OHLCV download, only used when fast_info has no quote at all
+        if price is None:
+             history = ticker_obj.history(period="1d", interval="1d", auto_adjust=False, timeout=5)
              if not history.empty:
                  price = history['Close'].iloc[-1]
                  
         return price
-    except Exception as e:
-        print(f"Error fetching price for {ticker}: {e}")
+    except Exception:
         return None
 
+def get_current_prices(symbols):
+    """Fetches the current prices of several Yahoo symbols with one batched yfinance download.
+
+    Returns a symbol -> price dict (None where no quote could be found).
+    """
+    try:
+        # Sorted tuple so equal symbol sets share one cache entry regardless of order
+        return _fetch_prices(tuple(sorted(set(symbols))))
+    except _IncompleteResult as e:
+        return e.result
+
+@st.cache_data(ttl=PRICE_TTL, show_spinner=False)
+def _fetch_prices(symbols):
+    """Cached batch download behind get_current_prices, keyed by a sorted symbol tuple.
+
+    Raises _IncompleteResult when any symbol has no quote, so outages are not cached.
+    """
+    symbols = list(symbols)
+    prices = {}
+    if not symbols:
+        return prices
+
+    try:
+        data = yf.download(symbols, period="2d", group_by="ticker", threads=True, progress=False)
+    except Exception:
+        data = pd.DataFrame()
+
+    for symbol in symbols:
+        try:
+            close = data[symbol]['Close'].dropna()
+        except KeyError:
+            continue
+        if not close.empty:
+            prices[symbol] = float(close.iloc[-1])
+
+    # Fall back to per-ticker lookups, run concurrently, for anything missing from the batch response
+    missing = [symbol for symbol in symbols if symbol not in prices]
+    if missing:
+        with ThreadPoolExecutor(max_workers=min(32, len(missing))) as executor:
+            prices.update(zip(missing, executor.map(_fetch_quote, missing)))
+
+    if any(price is None for price in prices.values()):
+        raise _IncompleteResult(prices)
+    return prices
+
+def get_portfolio_signature():
+    """Returns a cheap fingerprint of the investments table, used as the stats cache key."""
+    conn = get_connection()
+    with conn.session as s:
+        # The md5 of id/ticker/type catches external edits that leave the sums unchanged
+        row = s.execute(text("""
+            SELECT COUNT(*), SUM(amount), SUM(quantity), MAX(id),
+                   md5(string_agg(id || ':' || ticker || ':' || asset_type, ',' ORDER BY id))
+            FROM investments
+        """)).fetchone()
+    return tuple(row)
+
 def get_portfolio_stats():
-    """Calculates portfolio statistics."""
-    df = get_transactions()
-    if df.empty:
+    """Calculates portfolio statistics (memoized while the investments table is unchanged)."""
+    try:
+        return compute_portfolio_stats(get_portfolio_signature())
+    except _IncompleteResult as e:
+        # Some quotes are unavailable: show the stats for this run without memoizing them
+        return e.result
+    except SQLAlchemyError:
+        # Only DB read failures fall back to "no data"; anything else is a bug and should surface
+        return None
+
+@st.cache_data(ttl=PRICE_TTL, show_spinner=False)
+def compute_portfolio_stats(signature):
+    """Calculates portfolio statistics for the given table signature (DB errors propagate)."""
+    grouped = get_aggregated_positions()
+    if grouped.empty:
         return None
     
-    stats = []
-    # Ensure numeric
-    df['amount'] = pd.to_numeric(df['amount'])
-    df['quantity'] = pd.to_numeric(df['quantity'])
-    
-    grouped = df.groupby(['ticker', 'asset_type'])[['amount', 'quantity']].sum().reset_index()
+    # Guard for rows inserted outside the app (its forms never allow a quantity <= 0):
+    # zero-quantity positions stay listed but need no quote
+    quoted = grouped.loc[grouped['quantity'] != 0, 'symbol'].tolist()
+    prices = get_current_prices(quoted)
     
-    total_invested = 0
-    total_current_value = 0
+    # Column math over the whole frame instead of building one dict per position
+    invested = grouped['amount']
+    current_price = grouped['symbol'].map(prices).astype(float)
+    current_value = (grouped['quantity'] * current_price).fillna(0)
+    profit_loss = current_value - invested
     
-    for _, row in grouped.iterrows():
-        ticker = row['ticker']
-        quantity = row['quantity']
-        asset_type = row['asset_type']
-        invested = row['amount']
-        
-        current_price = get_current_price(ticker, asset_type)
-        current_value = (quantity * current_price) if current_price else 0
-        
-        stats.append({
-            "Ticker": ticker,
-            "Type": asset_type,
-            "Invested": invested,
-            "Quantity": quantity,
-            "Current Price": current_price,
-            "Current Value": current_value,
-            "Profit/Loss": current_value - invested,
-            "Return %": ((current_value - invested) / invested * 100) if invested > 0 else 0
-        })
-        
-        total_invested += invested
-        total_current_value += current_value
+    details = pd.DataFrame({
+        "Ticker": grouped['symbol'],
+        "Type": grouped['asset_type'],
+        "Invested": invested,
+        "Quantity": grouped['quantity'],
+        "Current Price": current_price,
+        "Current Value": current_value,
+        "Profit/Loss": profit_loss,
+        "Return %": np.where(invested > 0, profit_loss / invested.where(invested > 0) * 100, 0)
+    })
         
-    return {
-        "total_invested": total_invested,
-        "total_current_value": total_current_value,
-        "details": pd.DataFrame(stats)
+    stats = {
+        "total_invested": float(invested.sum()),
+        "total_current_value": float(current_value.sum()),
+        "details": details
     }
+    if any(prices.get(symbol) is None for symbol in quoted):
+        raise _IncompleteResult(stats)
+    return stats